@@ -3,11 +3,15 @@ Flask Backend for Idiom-Aware Translation
 ==========================================
 """
 
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, render_template, request, jsonify
 from flask_cors import CORS
 import os
 import json
 import re
+import queue
+import threading
+import time
+from concurrent.futures import Future
 
 from hybrid_translator import HybridTranslator
 
@@ -18,15 +22,50 @@ CORS(app)
 # Configuration
 MODEL_PATH = os.environ.get('MODEL_PATH', 'models/')  # Your downloaded model folder
 IDIOM_MAPPING_PATH = os.environ.get('IDIOM_MAPPING_PATH', 'data/idiom_mapping.json')
+MODEL_ENGINE = os.environ.get('MODEL_ENGINE', 'auto')  # 'auto', 'hf' or 'ct2'
+# Run langdetect on Latin-script text to reject non-English languages (slow)
+STRICT_LANG_CHECK = os.environ.get('STRICT_LANG_CHECK', '').lower() in ('1', 'true', 'yes')
 
-# Initialize translator (lazy loading)
+# Request coalescing: concurrent /translate calls share one model batch
+MAX_BATCH = int(os.environ.get('MAX_BATCH', '16'))
+BATCH_DELTA_MS = int(os.environ.get('BATCH_DELTA_MS', '20'))
+TRANSLATE_TIMEOUT = float(os.environ.get('TRANSLATE_TIMEOUT', '600'))
+
+# Wider beams cost memory and hold the model lock for every other request
+MAX_NUM_BEAMS = 8
+
+# Initialize translator (lazy loading, or at boot from wsgi.py)
 translator = None
+_translator_lock = threading.Lock()
+
+# Pending (text, direction, num_beams, future) items for the batch worker
+_translate_queue = queue.Queue()
+_batch_worker = None
+_batch_worker_lock = threading.Lock()
+
+# langdetect.detect, imported on first strict check (False if not installed)
+_langdetect = None
 
 # Language detection patterns
 _SINHALA_CHAR_RE = re.compile(r"[\u0D80-\u0DFF]")
 _LATIN_CHAR_RE = re.compile(r"[A-Za-z]")
 
 
+def _get_langdetect():
+    """Import langdetect once and return its detect function (or None)."""
+    global _langdetect
+    
+    if _langdetect is None:
+        try:
+            from langdetect import detect, DetectorFactory
+            DetectorFactory.seed = 0
+            _langdetect = detect
+        except ImportError:
+            _langdetect = False
+    
+    return _langdetect or None
+
+
 def detect_language(text: str) -> str:
     """
     Detect if text is English or Sinhala.
@@ -40,24 +79,26 @@ def detect_language(text: str) -> str:
     elif has_sinhala:
         return 'si'
     elif has_latin:
-        # Use langdetect for better accuracy on Latin text
+        # Only English uses Latin script here; langdetect is opt-in
+        langdetect_detect = _get_langdetect() if STRICT_LANG_CHECK else None
+        if langdetect_detect is None:
+            return 'en'
         try:
-            from langdetect import detect, DetectorFactory
-            DetectorFactory.seed = 0
-            detected = detect(text)
-            return detected
+            return langdetect_detect(text)
         except:
             return 'en'  # Fallback to English
     else:
         return 'unknown'
 
 
-def validate_language_support(text: str, expected_lang: str = None):
+def validate_language_support(text: str, expected_lang: str = None, detected: str = None):
     """
     Validate that text language is supported (English or Sinhala only).
+    Pass detected when detect_language(text) has already been run.
     Returns error response if unsupported, None if valid.
     """
-    detected = detect_language(text)
+    if detected is None:
+        detected = detect_language(text)
     
     # Supported languages
     if detected in ['en', 'si', 'mixed']:
@@ -81,28 +122,82 @@ def validate_language_support(text: str, expected_lang: str = None):
 
 
 def get_translator():
-    """Get or initialize translator."""
+    """Get or initialize translator (safe to call from multiple threads)."""
     global translator
     
     if translator is None:
-        print("Initializing translator...")
+        with _translator_lock:
+            if translator is None:
+                print("Initializing translator...")
+                
+                # Check if using local model or HuggingFace
+                if os.path.exists(MODEL_PATH):
+                    model_path = MODEL_PATH
+                    print(f"Using local model: {model_path}")
+                else:
+                    model_path = "facebook/nllb-200-distilled-600M"
+                    print(f"Using HuggingFace model: {model_path}")
+                
+                trans = HybridTranslator(
+                    model_path=model_path,
+                    idiom_mapping_path=IDIOM_MAPPING_PATH,
+                    device='auto',
+                    engine=MODEL_ENGINE
+                )
+                trans.load_model()
+                translator = trans
+    
+    return translator
+
+
+def _run_batch_worker():
+    """Drain queued translations and run them in batches."""
+    while True:
+        batch = [_translate_queue.get()]
+        deadline = time.monotonic() + BATCH_DELTA_MS / 1000
         
-        # Check if using local model or HuggingFace
-        if os.path.exists(MODEL_PATH):
-            model_path = MODEL_PATH
-            print(f"Using local model: {model_path}")
-        else:
-            model_path = "facebook/nllb-200-distilled-600M"
-            print(f"Using HuggingFace model: {model_path}")
+        # Collect whatever else arrives within the batching window
+        while len(batch) < MAX_BATCH:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(_translate_queue.get(timeout=remaining))
+            except queue.Empty:
+                break
         
-        translator = HybridTranslator(
-            model_path=model_path,
-            idiom_mapping_path=IDIOM_MAPPING_PATH,
-            device='auto'
-        )
-        translator.load_model()
+        groups = {}
+        for item in batch:
+            groups.setdefault((item[1], item[2]), []).append(item)
+        
+        for (direction, num_beams), items in groups.items():
+            try:
+                results = get_translator().translate_batch(
+                    [text for text, _, _, _ in items],
+                    direction=direction,
+                    num_beams=num_beams
+                )
+            except Exception as e:
+                for _, _, _, future in items:
+                    future.set_exception(e)
+                continue
+            
+            for (_, _, _, future), result in zip(items, results):
+                future.set_result(result)
+
+
+def translate_coalesced(text: str, direction: str, num_beams: int = None):
+    """Queue a translation for the batch worker and wait for its result."""
+    global _batch_worker
     
-    return translator
+    with _batch_worker_lock:
+        if _batch_worker is None:
+            _batch_worker = threading.Thread(target=_run_batch_worker, daemon=True)
+            _batch_worker.start()
+    
+    future = Future()
+    _translate_queue.put((text, direction, num_beams, future))
+    return future.result(timeout=TRANSLATE_TIMEOUT)
 
 
 @app.route('/')
@@ -111,6 +206,73 @@ def index():
     return render_template('index.html')
 
 
+def _parse_translate_request(data):
+    """
+    Validate a /translate style request body.
+    Returns (text, direction, num_beams, None) or (None, None, None, error response).
+    """
+    if not data or 'text' not in data:
+        return None, None, None, (jsonify({
+            'success': False,
+            'error': 'No text provided'
+        }), 400)
+    
+    text = data['text'].strip()
+    
+    if not text:
+        return None, None, None, (jsonify({
+            'success': False,
+            'error': 'Empty text'
+        }), 400)
+    
+    num_beams = data.get('num_beams')
+    if num_beams is not None and (type(num_beams) is not int or
+                                  not 1 <= num_beams <= MAX_NUM_BEAMS):
+        return None, None, None, (jsonify({
+            'success': False,
+            'error': f'num_beams must be an integer between 1 and {MAX_NUM_BEAMS}'
+        }), 400)
+    
+    # Get direction (en-si or si-en)
+    direction = data.get('direction', 'auto')
+    
+    # Detect once; used for auto direction and validation
+    detected = detect_language(text)
+    
+    # Auto-detect language if direction is auto
+    if direction == 'auto':
+        if detected == 'si':
+            direction = 'si-en'
+        else:
+            direction = 'en-si'
+    
+    # Validate language support
+    error_response = validate_language_support(text, detected=detected)
+    if error_response:
+        return None, None, None, error_response
+    
+    return text, direction, num_beams, None
+
+
+def _result_payload(result) -> dict:
+    """JSON body for a TranslationResult."""
+    return {
+        'success': True,
+        'source': result.source,
+        'translation': result.translation,
+        'source_lang': result.source_lang,
+        'target_lang': result.target_lang,
+        'idioms': result.detected_idioms,
+        'idiom_accuracy': result.idiom_accuracy,
+        'method': result.method
+    }
+
+
+def _sse(event: str, payload: dict) -> str:
+    """Format one Server-Sent Events message."""
+    return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+
 @app.route('/translate', methods=['POST'])
 def translate():
     """
@@ -119,7 +281,8 @@ def translate():
     Request JSON:
         {
             "text": "Text here",
-            "direction": "en-si" or "si-en" (optional, auto-detected if not provided)
+            "direction": "en-si" or "si-en" (optional, auto-detected if not provided),
+            "num_beams": 5 (optional, 1-8; greedy for short/idiom text and 5 otherwise)
         }
     
     Response JSON:
@@ -135,59 +298,68 @@ def translate():
         }
     """
     try:
-        data = request.get_json()
-        
-        if not data or 'text' not in data:
-            return jsonify({
-                'success': False,
-                'error': 'No text provided'
-            }), 400
-        
-        text = data['text'].strip()
-        
-        if not text:
-            return jsonify({
-                'success': False,
-                'error': 'Empty text'
-            }), 400
-        
-        # Get direction (en-si or si-en)
-        direction = data.get('direction', 'auto')
-        
-        # Auto-detect language if direction is auto
-        if direction == 'auto':
-            detected = detect_language(text)
-            if detected == 'si':
-                direction = 'si-en'
-            else:
-                direction = 'en-si'
-        
-        # Validate language support
-        error_response = validate_language_support(text)
+        text, direction, num_beams, error_response = _parse_translate_request(request.get_json())
         if error_response:
             return error_response
         
-        # Get translator and translate
-        trans = get_translator()
-        result = trans.translate(text, direction=direction)
+        # Translate (batched with any concurrent requests)
+        result = translate_coalesced(text, direction, num_beams)
         
+        return jsonify(_result_payload(result))
+    
+    except Exception as e:
+        print(f"Translation error: {e}")
         return jsonify({
-            'success': True,
-            'source': result.source,
-            'translation': result.translation,
-            'source_lang': result.source_lang,
-            'target_lang': result.target_lang,
-            'idioms': result.detected_idioms,
-            'idiom_accuracy': result.idiom_accuracy,
-            'method': result.method
-        })
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@app.route('/translate-stream', methods=['POST'])
+def translate_stream():
+    """
+    Streaming translation as Server-Sent Events.
+    
+    Request JSON: same as /translate
+    
+    Greedy decodes stream token by token. Inputs that need beam search go
+    through the batch worker and arrive as a single delta.
     
+    Response events:
+        event: delta   data: {"text": "newly decoded text"}
+        event: result  data: {same JSON as /translate}
+        event: error   data: {"success": false, "error": "..."}
+    """
+    try:
+        text, direction, num_beams, error_response = _parse_translate_request(request.get_json())
+        if error_response:
+            return error_response
     except Exception as e:
         print(f"Translation error: {e}")
         return jsonify({
             'success': False,
             'error': str(e)
         }), 500
+    
+    def events():
+        try:
+            stream = get_translator().translate_stream(
+                text, direction=direction, num_beams=num_beams, translate=translate_coalesced
+            )
+            for kind, payload in stream:
+                if kind == 'delta':
+                    yield _sse('delta', {'text': payload})
+                else:
+                    yield _sse('result', _result_payload(payload))
+        except Exception as e:
+            print(f"Translation error: {e}")
+            yield _sse('error', {'success': False, 'error': str(e)})
+    
+    return Response(
+        events(),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
 
 
 @app.route('/detect-idioms', methods=['POST'])
@@ -272,5 +444,5 @@ if __name__ == '__main__':
     print("\nStarting server...")
     print("Open http://localhost:5000 in your browser\n")
     
-    # Run the app
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    # Development server; use wsgi.py with gunicorn in production
+    app.run(host='0.0.0.0', port=5000, threaded=True)
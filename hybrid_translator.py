@@ -2,14 +2,26 @@
 Hybrid Translator Module
 ========================
 Combines NLLB Neural Translation + Idiom Dictionary
+
+torch, transformers and pandas are imported on first use so that
+constructing a HybridTranslator (and importing this module) stays cheap.
 """
 
-import torch
+import functools
 import json
+import os
+import pickle
 import re
-from typing import Dict, List, Optional
+import tempfile
+import threading
+from collections import OrderedDict, defaultdict
+from typing import Dict, List, Optional, Tuple
 from dataclasses import dataclass
-from transformers import AutoModelForSeq2SeqLM, AutoTokenizer
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
 
 
 @dataclass
@@ -24,6 +36,29 @@ class TranslationResult:
     method: str
 
 
+class LRUCache:
+    """Small thread-safe least-recently-used cache."""
+    
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                return default
+            self._data.move_to_end(key)
+            return self._data[key]
+    
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+
 class IdiomDetector:
     """Detects idioms in English and Sinhala text."""
     
@@ -34,70 +69,154 @@ class IdiomDetector:
         # Sinhala -> English reverse mapping
         self.reverse_mapping = {v: k for k, v in self.idiom_mapping.items()}
         
-        # English idiom patterns
-        self.patterns = {}
-        for idiom in self.idiom_mapping.keys():
-            escaped = re.escape(idiom)
-            pattern = re.compile(r'\b' + escaped + r'\b', re.IGNORECASE)
-            self.patterns[idiom] = pattern
-        
-        self.sorted_idioms = sorted(self.patterns.keys(), key=len, reverse=True)
+        # Aho-Corasick automata: one pass over the text finds every idiom
+        self._ac = self._build_automaton(self.idiom_mapping)
+        self._si_ac = self._build_automaton(self.reverse_mapping)
+        
+        # Without pyahocorasick, fall back to bucketing idioms by how they start:
+        # only idioms whose first word (English) or first codepoints (Sinhala)
+        # occur in the text are ever compared
+        self._en_buckets, self._en_unbucketed = {}, []
+        self._si_buckets, self._si_unbucketed = {}, []
+        if ahocorasick is None:
+            self._en_buckets, self._en_unbucketed = self._build_buckets(
+                self.idiom_mapping, self._first_word)
+            self._si_buckets, self._si_unbucketed = self._build_buckets(
+                self.reverse_mapping, self._first_codepoints)
+    
+    _WORD_RE = re.compile(r'\w+')
+    SINHALA_PREFIX_LEN = 2
+    
+    @staticmethod
+    def _build_automaton(idioms) -> Optional['ahocorasick.Automaton']:
+        """Build an Aho-Corasick automaton over the given idioms."""
+        if ahocorasick is None or not idioms:
+            return None
+        automaton = ahocorasick.Automaton()
+        for idiom in idioms:
+            automaton.add_word(idiom, idiom)
+        automaton.make_automaton()
+        return automaton
+    
+    @classmethod
+    def _first_word(cls, idiom: str) -> Optional[str]:
+        match = cls._WORD_RE.match(idiom)
+        return match.group() if match else None
+    
+    @classmethod
+    def _first_codepoints(cls, idiom: str) -> Optional[str]:
+        return idiom[:cls.SINHALA_PREFIX_LEN] if len(idiom) >= cls.SINHALA_PREFIX_LEN else None
+    
+    @staticmethod
+    def _build_buckets(idioms, key) -> Tuple[Dict[str, List[str]], List[str]]:
+        """Group idioms by key(idiom); idioms without a key are kept aside."""
+        buckets = defaultdict(list)
+        unbucketed = []
+        for idiom in idioms:
+            bucket = key(idiom)
+            if bucket is None:
+                unbucketed.append(idiom)
+            else:
+                buckets[bucket].append(idiom)
+        return dict(buckets), unbucketed
+    
+    @staticmethod
+    def _scan_automaton(automaton, text: str):
+        """Yield (start, end, idiom) for every idiom occurrence in text."""
+        for last, idiom in automaton.iter(text):
+            yield last - len(idiom) + 1, last + 1, idiom
+    
+    @staticmethod
+    def _scan_unbucketed(idioms: List[str], text: str):
+        for idiom in idioms:
+            start = text.find(idiom)
+            while start != -1:
+                yield start, start + len(idiom), idiom
+                start = text.find(idiom, start + 1)
+    
+    def _scan_english(self, text: str):
+        """Yield (start, end, idiom) for every English idiom occurrence in text."""
+        if self._ac is not None:
+            yield from self._scan_automaton(self._ac, text)
+            return
         
-        # Sinhala idiom patterns
-        self.sinhala_patterns = {}
-        for sinhala_idiom in self.reverse_mapping.keys():
-            # Sinhala doesn't have word boundaries like English, so we use simpler pattern
-            escaped = re.escape(sinhala_idiom)
-            pattern = re.compile(escaped)
-            self.sinhala_patterns[sinhala_idiom] = pattern
+        for word in self._WORD_RE.finditer(text):
+            start = word.start()
+            for idiom in self._en_buckets.get(word.group(), ()):
+                if text.startswith(idiom, start):
+                    yield start, start + len(idiom), idiom
+        yield from self._scan_unbucketed(self._en_unbucketed, text)
+    
+    def _scan_sinhala(self, text: str):
+        """Yield (start, end, idiom) for every Sinhala idiom occurrence in text."""
+        if self._si_ac is not None:
+            yield from self._scan_automaton(self._si_ac, text)
+            return
         
-        self.sorted_sinhala_idioms = sorted(self.sinhala_patterns.keys(), key=len, reverse=True)
+        if self._si_buckets:
+            prefix_len = self.SINHALA_PREFIX_LEN
+            for start in range(len(text) - prefix_len + 1):
+                for idiom in self._si_buckets.get(text[start:start + prefix_len], ()):
+                    if text.startswith(idiom, start):
+                        yield start, start + len(idiom), idiom
+        yield from self._scan_unbucketed(self._si_unbucketed, text)
+    
+    @staticmethod
+    def _is_word_char(ch: str) -> bool:
+        return ch.isalnum() or ch == '_'
+    
+    @classmethod
+    def _is_boundary(cls, text: str, pos: int) -> bool:
+        """Equivalent of regex \\b at position pos."""
+        before = pos > 0 and cls._is_word_char(text[pos - 1])
+        after = pos < len(text) and cls._is_word_char(text[pos])
+        return before != after
+    
+    @staticmethod
+    def _select_longest(candidates: List[Tuple], text_length: int) -> List[Tuple]:
+        """Keep the longest matches, skipping any that overlap an accepted one."""
+        # Longest idioms win, ties go to the earliest occurrence
+        candidates.sort(key=lambda c: (c[0] - c[1], c[0]))
+        
+        covered = bytearray(text_length)
+        selected = []
+        
+        for candidate in candidates:
+            start, end = candidate[0], candidate[1]
+            if 1 in covered[start:end]:
+                continue
+            covered[start:end] = b'\x01' * (end - start)
+            selected.append(candidate)
+        
+        return selected
     
     def detect(self, text: str) -> List[Dict]:
         """Detect English idioms in text."""
-        detected = []
-        used_positions = set()
-        
-        for idiom in self.sorted_idioms:
-            pattern = self.patterns[idiom]
-            
-            for match in pattern.finditer(text):
-                start, end = match.start(), match.end()
-                
-                if any(start < ue and end > us for us, ue in used_positions):
-                    continue
-                
-                detected.append({
-                    'english': idiom,
-                    'sinhala': self.idiom_mapping[idiom],
-                    'position': (start, end)
-                })
-                used_positions.add((start, end))
-        
-        return detected
+        # Lowercase once; idiom keys are lowercase, so matching needs no case folding
+        text_lower = text.lower()
+        if len(text_lower) != len(text):
+            # Some characters lowercase to several (e.g. 'İ'); keep positions aligned with text
+            text_lower = ''.join(ch.lower() if len(ch.lower()) == 1 else ch for ch in text)
+        candidates = []
+        
+        for start, end, idiom in self._scan_english(text_lower):
+            if self._is_boundary(text_lower, start) and self._is_boundary(text_lower, end):
+                candidates.append((start, end, idiom))
+        
+        return [
+            {'english': idiom, 'sinhala': self.idiom_mapping[idiom], 'position': (start, end)}
+            for start, end, idiom in self._select_longest(candidates, len(text))
+        ]
     
     def detect_sinhala(self, text: str) -> List[Dict]:
         """Detect Sinhala idioms in text."""
-        detected = []
-        used_positions = set()
+        # Sinhala doesn't have word boundaries like English, so we match raw substrings
+        candidates = list(self._scan_sinhala(text))
         
-        for sinhala_idiom in self.sorted_sinhala_idioms:
-            pattern = self.sinhala_patterns[sinhala_idiom]
-            
-            for match in pattern.finditer(text):
-                start, end = match.start(), match.end()
-                
-                if any(start < ue and end > us for us, ue in used_positions):
-                    continue
-                
-                detected.append({
-                    'sinhala': sinhala_idiom,
-                    'english': self.reverse_mapping[sinhala_idiom],
-                    'position': (start, end)
-                })
-                used_positions.add((start, end))
-        
-        return detected
+        return [
+            {'sinhala': sinhala_idiom, 'english': self.reverse_mapping[sinhala_idiom], 'position': (start, end)}
+            for start, end, sinhala_idiom in self._select_longest(candidates, len(text))
+        ]
     
     def get_sinhala_idiom(self, english_idiom: str) -> Optional[str]:
         """Get Sinhala translation of an English idiom."""
@@ -108,19 +227,99 @@ class IdiomDetector:
         return self.reverse_mapping.get(sinhala_idiom)
 
 
+# Bump when the layout of cached objects (e.g. IdiomDetector attributes) changes
+CACHE_VERSION = 2
+
+
+def _load_cached(path: str, build):
+    """
+    Return build(path), cached as a pickle next to path.
+    The cache is reused while it is at least as new as the source file
+    and was written with the current CACHE_VERSION.
+    """
+    cache_path = path + '.pkl'
+    
+    try:
+        if os.path.getmtime(cache_path) >= os.path.getmtime(path):
+            with open(cache_path, 'rb') as f:
+                version, value = pickle.load(f)
+            if version == CACHE_VERSION:
+                return value
+    except Exception:
+        pass  # Missing or stale cache, rebuild below
+    
+    value = build(path)
+    
+    # Write to a temp file and swap it in, so readers never see a partial pickle
+    tmp_path = None
+    try:
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(cache_path) or '.', suffix='.pkl.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump((CACHE_VERSION, value), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, cache_path)
+    except Exception as e:
+        print(f"⚠️ Cache not written: {e}")
+        if tmp_path and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    
+    return value
+
+
+def _build_detector(idiom_mapping_path: str) -> IdiomDetector:
+    """Parse the idiom mapping JSON and build its detector."""
+    with open(idiom_mapping_path, 'r', encoding='utf-8') as f:
+        idiom_mapping = json.load(f)
+    return IdiomDetector(idiom_mapping)
+
+
+@functools.lru_cache(maxsize=None)
+def _shared_detector(idiom_mapping_path: str) -> IdiomDetector:
+    """One detector per mapping file per process, shared by all translators."""
+    return _load_cached(idiom_mapping_path, _build_detector)
+
+
+def _build_sentence_mapping(dataset_path: str) -> Dict[str, Dict]:
+    """Read English -> Sinhala example sentences from the dataset sheet."""
+    import pandas as pd
+    columns = ('Figurative Example', 'Sinhala Translation Example')
+    df = pd.read_excel(
+        dataset_path,
+        engine='openpyxl',
+        usecols=lambda col: str(col).strip() in columns
+    )
+    df.columns = df.columns.str.strip()
+    if not all(col in df.columns for col in columns):
+        return {}
+    
+    en = df['Figurative Example'].fillna('').astype(str).str.strip().str.lower()
+    si = df['Sinhala Translation Example'].fillna('').astype(str).str.strip()
+    mask = (en != '') & (si != '') & (en != 'nan') & (si != 'nan')
+    return dict(zip(en[mask], [{'sinhala': s} for s in si[mask]]))
+
+
 class HybridTranslator:
     """
     Hybrid Translation System: NLLB + Idiom Dictionary
     """
     
-    def __init__(self, model_path: str, idiom_mapping_path: str, device: str = 'auto'):
+    # Beam search is reserved for long inputs; short or idiom-masked text decodes greedily
+    DEFAULT_NUM_BEAMS = 5
+    GREEDY_MAX_TOKENS = 16
+    
+    # Repeated inputs (UI re-submits, health checks) skip the model entirely
+    TRANSLATION_CACHE_SIZE = 4096
+    
+    _PUNCT_RE = re.compile(r'[^\w\s]')
+    
+    def __init__(self, model_path: str, idiom_mapping_path: str, device: str = 'auto',
+                 dataset_path: str = 'data/idioms_dataset.xlsx', engine: str = 'auto'):
         self.model_path = model_path
-        self.device = self._get_device(device)
-        
-        with open(idiom_mapping_path, 'r', encoding='utf-8') as f:
-            idiom_mapping = json.load(f)
+        self.dataset_path = dataset_path
+        self.device_spec = device
+        self.device = None  # Resolved in load_model (needs torch)
+        self.engine = self._get_engine(engine)
         
-        self.detector = IdiomDetector(idiom_mapping)
+        self.detector = _shared_detector(os.path.abspath(idiom_mapping_path))
         
         self.source_lang = "eng_Latn"
         self.target_lang = "sin_Sinh"
@@ -128,9 +327,19 @@ class HybridTranslator:
         self.model = None
         self.tokenizer = None
         self.is_loaded = False
+        
+        # Dataset sentence pairs, loaded with the model or on the first lookup
+        self.sentence_mapping = None
+        self.sentence_mapping_clean = None
+        self._dataset_lock = threading.Lock()
+        
+        self._model_lock = threading.RLock()
+        self._translation_cache = LRUCache(self.TRANSLATION_CACHE_SIZE)
+        self._token_count_cache = LRUCache(self.TRANSLATION_CACHE_SIZE)
     
-    def _get_device(self, device: str) -> torch.device:
+    def _get_device(self, device: str) -> 'torch.device':
         """Determine the best device."""
+        import torch
         if device == 'auto':
             if torch.cuda.is_available():
                 return torch.device('cuda')
@@ -140,43 +349,216 @@ class HybridTranslator:
                 return torch.device('cpu')
         return torch.device(device)
     
+    def _get_engine(self, engine: str) -> str:
+        """Pick the inference engine: 'hf' (transformers) or 'ct2' (CTranslate2)."""
+        if engine == 'auto':
+            # ct2-transformers-converter writes a model.bin + shared vocabulary
+            is_ct2 = (
+                os.path.exists(os.path.join(self.model_path, 'model.bin')) and
+                any(os.path.exists(os.path.join(self.model_path, name))
+                    for name in ('shared_vocabulary.json', 'shared_vocabulary.txt'))
+            )
+            return 'ct2' if is_ct2 else 'hf'
+        return engine
+    
     def load_model(self):
         """Load the NLLB model."""
-        if self.is_loaded:
-            return
+        with self._model_lock:
+            if self.is_loaded:
+                return
+            
+            from transformers import AutoModelForSeq2SeqLM, AutoTokenizer
+            
+            self.device = self._get_device(self.device_spec)
+            
+            print(f"Loading model from {self.model_path}...")
+            print(f"Using device: {self.device}")
+            
+            self.tokenizer = AutoTokenizer.from_pretrained(
+                self.model_path,
+                src_lang=self.source_lang,
+                tgt_lang=self.target_lang
+            )
+            
+            if self.engine == 'ct2':
+                import ctranslate2
+                on_cuda = self.device.type == 'cuda'
+                self.model = ctranslate2.Translator(
+                    self.model_path,
+                    device='cuda' if on_cuda else 'cpu',
+                    compute_type='int8_float16' if on_cuda else 'int8'
+                )
+            else:
+                self.model = AutoModelForSeq2SeqLM.from_pretrained(self.model_path)
+                self.model = self.model.to(self.device)
+                if self.device.type == 'cuda':
+                    self.model = self.model.half()  # FP16 matmuls on GPU
+                self.model.eval()
+                
+                # Fused attention kernels, when optimum is installed and supports this model
+                try:
+                    from optimum.bettertransformer import BetterTransformer
+                    self.model = BetterTransformer.transform(self.model)
+                except ImportError:
+                    pass
+                except Exception as e:
+                    print(f"⚠️ BetterTransformer not applied: {e}")
+            
+            self._load_dataset()
+            
+            self.is_loaded = True
+            print(f" Model loaded successfully! (engine: {self.engine})")
+    
+    def _nllb_translate(self, text: str, direction: str = 'en-si', max_length: int = 256,
+                        num_beams: Optional[int] = None) -> str:
+        """Basic NLLB translation with direction support."""
+        return self._nllb_translate_batch(
+            [text], direction=direction, max_length=max_length, num_beams=num_beams
+        )[0]
+    
+    def _pick_num_beams(self, text: str) -> int:
+        """Greedy for short inputs and idiom placeholders, beam search otherwise."""
+        if '__IDIOM_' in text:
+            return 1
+        token_count = self._token_count_cache.get(text)
+        if token_count is None:
+            # The fast tokenizer can't be shared across threads while a batch is encoding
+            with self._model_lock:
+                token_count = len(self.tokenizer(text)['input_ids'])
+            self._token_count_cache.put(text, token_count)
+        if token_count < self.GREEDY_MAX_TOKENS:
+            return 1
+        return self.DEFAULT_NUM_BEAMS
+    
+    def _nllb_translate_batch(self, texts: List[str], direction: str = 'en-si',
+                              max_length: int = 256, batch_size: int = 16,
+                              num_beams: Optional[int] = None) -> List[str]:
+        """
+        Translate several texts with batched NLLB generate calls.
+        Texts are grouped by beam width and sorted by length before chunking
+        so each batch pads little. num_beams=None picks a width per text.
+        Results are cached per (text, direction, max_length, num_beams).
+        """
+        translations = [None] * len(texts)
+        misses = []
         
-        print(f"Loading model from {self.model_path}...")
-        print(f"Using device: {self.device}")
+        for i, text in enumerate(texts):
+            translations[i] = self._translation_cache.get((text, direction, max_length, num_beams))
+            if translations[i] is None:
+                misses.append(i)
         
-        self.tokenizer = AutoTokenizer.from_pretrained(
-            self.model_path,
-            src_lang=self.source_lang,
-            tgt_lang=self.target_lang
-        )
+        if not misses:
+            return translations
         
-        self.model = AutoModelForSeq2SeqLM.from_pretrained(self.model_path)
-        self.model = self.model.to(self.device)
-        self.model.eval()
+        # One batch at a time: the tokenizer src_lang and the model are shared state
+        with self._model_lock:
+            if not self.is_loaded:
+                self.load_model()
+            
+            # Set source and target languages based on direction
+            if direction == 'en-si':
+                src_lang = "eng_Latn"
+                tgt_lang = "sin_Sinh"
+            else:  # si-en
+                src_lang = "sin_Sinh"
+                tgt_lang = "eng_Latn"
+            
+            self.tokenizer.src_lang = src_lang
+            
+            groups = {}
+            for i in misses:
+                beams = num_beams if num_beams is not None else self._pick_num_beams(texts[i])
+                groups.setdefault(beams, []).append(i)
+            
+            for beams, indices in groups.items():
+                order = sorted(indices, key=lambda i: len(texts[i]))
+                
+                for chunk_start in range(0, len(order), batch_size):
+                    chunk = order[chunk_start:chunk_start + batch_size]
+                    batch = [texts[i] for i in chunk]
+                    
+                    if self.engine == 'ct2':
+                        decoded = self._ct2_generate(batch, tgt_lang, max_length, beams)
+                    else:
+                        decoded = self._hf_generate(batch, tgt_lang, max_length, beams)
+                    
+                    for i, translation in zip(chunk, decoded):
+                        translations[i] = translation
+                        self._translation_cache.put((texts[i], direction, max_length, num_beams), translation)
         
-        self.is_loaded = True
-        print(" Model loaded successfully!")
+        return translations
     
-    def _nllb_translate(self, text: str, direction: str = 'en-si', max_length: int = 256) -> str:
-        """Basic NLLB translation with direction support."""
+    def _nllb_stream(self, text: str, direction: str = 'en-si', max_length: int = 256):
+        """Yield NLLB output text as it is decoded (greedy)."""
+        cache_key = (text, direction, max_length, 1)
+        cached = self._translation_cache.get(cache_key)
+        if cached is not None:
+            yield cached
+            return
+        
         if not self.is_loaded:
             self.load_model()
         
-        # Set source and target languages based on direction
+        if self.engine == 'ct2':
+            # No incremental detokenization for CTranslate2 here; send it in one piece
+            yield self._nllb_translate(text, direction=direction, max_length=max_length, num_beams=1)
+            return
+        
+        import torch
+        from transformers import TextIteratorStreamer
+        
         if direction == 'en-si':
-            src_lang = "eng_Latn"
-            tgt_lang = "sin_Sinh"
+            src_lang, tgt_lang = "eng_Latn", "sin_Sinh"
         else:  # si-en
-            src_lang = "sin_Sinh"
-            tgt_lang = "eng_Latn"
+            src_lang, tgt_lang = "sin_Sinh", "eng_Latn"
         
-        self.tokenizer.src_lang = src_lang
+        streamer = TextIteratorStreamer(self.tokenizer, skip_special_tokens=True)
+        errors = []
+        
+        def run_generate():
+            try:
+                with self._model_lock:
+                    self.tokenizer.src_lang = src_lang
+                    inputs = self.tokenizer(
+                        text,
+                        return_tensors="pt",
+                        truncation=True,
+                        max_length=max_length
+                    )
+                    inputs = {k: v.to(self.device) for k, v in inputs.items()}
+                    with torch.inference_mode():
+                        self.model.generate(
+                            **inputs,
+                            forced_bos_token_id=self.tokenizer.convert_tokens_to_ids(tgt_lang),
+                            max_length=max_length,
+                            num_beams=1,
+                            do_sample=False,
+                            streamer=streamer
+                        )
+            except Exception as e:
+                errors.append(e)
+                streamer.end()
+        
+        thread = threading.Thread(target=run_generate, daemon=True)
+        thread.start()
+        
+        pieces = []
+        for chunk in streamer:
+            if chunk:
+                pieces.append(chunk)
+                yield chunk
+        thread.join()
+        
+        if errors:
+            raise errors[0]
+        self._translation_cache.put(cache_key, ''.join(pieces))
+    
+    def _hf_generate(self, texts: List[str], tgt_lang: str, max_length: int,
+                     num_beams: int) -> List[str]:
+        """Translate one batch with transformers generate."""
+        import torch
         inputs = self.tokenizer(
-            text, 
+            texts,
             return_tensors="pt", 
             padding=True, 
             truncation=True, 
@@ -186,45 +568,147 @@ class HybridTranslator:
         
         forced_bos_token_id = self.tokenizer.convert_tokens_to_ids(tgt_lang)
         
-        with torch.no_grad():
-            outputs = self.model.generate(
-                **inputs,
-                forced_bos_token_id=forced_bos_token_id,
-                num_beams=5,
-                max_length=max_length
+        if num_beams == 1:
+            search = {'num_beams': 1, 'do_sample': False, 'early_stopping': False}
+        else:
+            search = {'num_beams': num_beams}
+        
+        with torch.inference_mode():
+            # Encode once; whichever decoding path runs (and every beam) reuses it
+            encoder_outputs = self.model.get_encoder()(**inputs)
+            
+            if num_beams == 1 and len(texts) > 1:
+                outputs = self._greedy_decode(
+                    encoder_outputs, inputs['attention_mask'], forced_bos_token_id, max_length
+                )
+            else:
+                outputs = self.model.generate(
+                    **inputs,
+                    encoder_outputs=encoder_outputs,
+                    forced_bos_token_id=forced_bos_token_id,
+                    max_length=max_length,
+                    **search
+                )
+        
+        return self.tokenizer.batch_decode(outputs, skip_special_tokens=True)
+    
+    def _greedy_decode(self, encoder_outputs, attention_mask, forced_bos_token_id: int,
+                       max_length: int) -> List[List[int]]:
+        """
+        Greedy decoding that drops finished sentences from the working batch.
+        model.generate keeps finished rows padded until the longest one ends;
+        here every step only runs the decoder on sentences still in progress.
+        
+        Each row gets the same argmax-until-EOS decode it would get on its own,
+        but not necessarily the same tokens as a padded model.generate batch:
+        padding changes the numerics, and near-tied logits can flip.
+        """
+        import torch
+        encoder_hidden_states = encoder_outputs.last_hidden_state
+        eos_token_id = self.model.config.eos_token_id
+        
+        batch_size = attention_mask.shape[0]
+        sequences = [[] for _ in range(batch_size)]
+        active = torch.arange(batch_size, device=self.device)
+        prefix = [self.model.config.decoder_start_token_id, forced_bos_token_id]
+        decoder_input_ids = torch.tensor([prefix] * batch_size, device=self.device)
+        past_key_values = None
+        
+        for length in range(len(prefix) + 1, max_length + 1):
+            outputs = self.model(
+                encoder_outputs=(encoder_hidden_states,),
+                attention_mask=attention_mask,
+                decoder_input_ids=decoder_input_ids,
+                past_key_values=past_key_values,
+                use_cache=True
             )
+            next_tokens = outputs.logits[:, -1, :].argmax(dim=-1)
+            past_key_values = outputs.past_key_values
+            
+            for row, token in zip(active.tolist(), next_tokens.tolist()):
+                sequences[row].append(token)
+            
+            unfinished = next_tokens != eos_token_id
+            if length == max_length or not unfinished.any():
+                break
+            
+            if not unfinished.all():
+                # Compact the batch down to sentences that are still decoding
+                keep = unfinished.nonzero(as_tuple=True)[0]
+                active = active.index_select(0, keep)
+                next_tokens = next_tokens.index_select(0, keep)
+                encoder_hidden_states = encoder_hidden_states.index_select(0, keep)
+                attention_mask = attention_mask.index_select(0, keep)
+                if hasattr(past_key_values, 'reorder_cache'):
+                    past_key_values.reorder_cache(keep)
+                else:
+                    past_key_values = tuple(
+                        tuple(t.index_select(0, keep) for t in layer)
+                        for layer in past_key_values
+                    )
+            
+            decoder_input_ids = next_tokens.unsqueeze(-1)
         
-        return self.tokenizer.decode(outputs[0], skip_special_tokens=True)
+        return [prefix + tokens for tokens in sequences]
     
-    def _get_dataset_translation(self, text: str) -> dict:
-        """Check if exact sentence exists in dataset."""
-        if not hasattr(self, 'sentence_mapping'):
-            self.sentence_mapping = {}
+    def _ct2_generate(self, texts: List[str], tgt_lang: str, max_length: int,
+                      num_beams: int) -> List[str]:
+        """Translate one batch with CTranslate2 (HF tokenizer on both ends)."""
+        source_tokens = [
+            self.tokenizer.convert_ids_to_tokens(
+                self.tokenizer.encode(text, truncation=True, max_length=max_length)
+            )
+            for text in texts
+        ]
+        
+        results = self.model.translate_batch(
+            source_tokens,
+            target_prefix=[[tgt_lang]] * len(texts),
+            beam_size=num_beams,
+            max_decoding_length=max_length
+        )
+        
+        # Drop the target language prefix from each best hypothesis
+        return [
+            self.tokenizer.decode(
+                self.tokenizer.convert_tokens_to_ids(result.hypotheses[0][1:]),
+                skip_special_tokens=True
+            )
+            for result in results
+        ]
+    
+    def _load_dataset(self):
+        """Load the dataset sentence pairs once, publishing both lookups together."""
+        with self._dataset_lock:
+            if self.sentence_mapping is not None:
+                return
+            
+            sentence_mapping = {}
             try:
-                import pandas as pd
-                df = pd.read_excel('data/idioms_dataset.xlsx')
-                df.columns = [col.strip() for col in df.columns]
-                for _, row in df.iterrows():
-                    en = str(row.get('Figurative Example', '')).strip().lower()
-                    si = str(row.get('Sinhala Translation Example', '')).strip()
-                    if en and si and en != 'nan' and si != 'nan':
-                        self.sentence_mapping[en] = {'sinhala': si}
-                print(f"✅ Loaded {len(self.sentence_mapping)} sentence pairs from dataset")
+                sentence_mapping = _load_cached(self.dataset_path, _build_sentence_mapping)
+                print(f"✅ Loaded {len(sentence_mapping)} sentence pairs from dataset")
             except Exception as e:
                 print(f"⚠️ Dataset not loaded: {e}")
+            
+            # Same sentences with punctuation stripped; first entry wins like the old scan
+            sentence_mapping_clean = {}
+            for en, data in sentence_mapping.items():
+                sentence_mapping_clean.setdefault(self._PUNCT_RE.sub('', en), data)
+            
+            self.sentence_mapping_clean = sentence_mapping_clean
+            self.sentence_mapping = sentence_mapping
+    
+    def _get_dataset_translation(self, text: str) -> dict:
+        """Check if exact sentence exists in dataset."""
+        if self.sentence_mapping is None:
+            self._load_dataset()
         
         text_lower = text.strip().lower()
         
         if text_lower in self.sentence_mapping:
             return self.sentence_mapping[text_lower]
         
-        text_clean = re.sub(r'[^\w\s]', '', text_lower)
-        for en, data in self.sentence_mapping.items():
-            en_clean = re.sub(r'[^\w\s]', '', en)
-            if text_clean == en_clean:
-                return data
-        
-        return None
+        return self.sentence_mapping_clean.get(self._PUNCT_RE.sub('', text_lower))
     
     def _smart_inject(self, translation: str, sinhala_idiom: str) -> str:
         """Inject idiom into translation."""
@@ -239,7 +723,26 @@ class HybridTranslator:
         words.insert(insert_pos, sinhala_idiom)
         return ' '.join(words)
     
-    def translate(self, text: str, direction: str = 'en-si') -> TranslationResult:
+    def _mask_idioms(self, text: str, detected_idioms: List[Dict], direction: str):
+        """Replace detected source idioms with placeholders for NLLB."""
+        parts = []
+        placeholder_map = {}
+        cursor = 0
+        
+        # Detector positions don't overlap, so one left-to-right pass rebuilds the text
+        for i, idiom in sorted(enumerate(detected_idioms), key=lambda item: item[1]['position'][0]):
+            placeholder = f"__IDIOM_{i}__"
+            start, end = idiom['position']
+            parts.append(text[cursor:start])
+            parts.append(placeholder)
+            cursor = end
+            placeholder_map[placeholder] = idiom['sinhala'] if direction == 'en-si' else idiom['english']
+        
+        parts.append(text[cursor:])
+        return ''.join(parts), placeholder_map
+    
+    def translate(self, text: str, direction: str = 'en-si',
+                  num_beams: Optional[int] = None) -> TranslationResult:
         """
         Bidirectional translation with hybrid approach and idiom detection.
         1. Detect idioms in source language
@@ -249,9 +752,107 @@ class HybridTranslator:
         Args:
             text: Text to translate
             direction: 'en-si' or 'si-en'
+            num_beams: Beam width for NLLB (None picks greedy or beam search per text)
+        """
+        return self.translate_batch([text], direction=direction, num_beams=num_beams)[0]
+    
+    def translate_batch(self, texts: List[str], direction: str = 'en-si',
+                        num_beams: Optional[int] = None) -> List[TranslationResult]:
+        """
+        Translate several texts in the same direction.
+        Every text that needs NLLB goes through one batched model call.
+        
+        Args:
+            texts: Texts to translate
+            direction: 'en-si' or 'si-en'
+            num_beams: Beam width for NLLB (None picks greedy or beam search per text)
         """
-        detected_idioms = []
+        results = [None] * len(texts)
+        pending = []
+        
+        for index, text in enumerate(texts):
+            exact_result, detected_idioms, modified_text, placeholder_map = self._prepare(text, direction)
+            if exact_result is not None:
+                results[index] = exact_result
+            else:
+                pending.append((index, text, detected_idioms, modified_text, placeholder_map))
         
+        translations = self._nllb_translate_batch(
+            [p[3] for p in pending], direction=direction, num_beams=num_beams
+        )
+        
+        for (index, text, detected_idioms, _, placeholder_map), translation in zip(pending, translations):
+            results[index] = self._finish(text, direction, detected_idioms, placeholder_map, translation)
+        
+        return results
+    
+    def translate_stream(self, text: str, direction: str = 'en-si', max_length: int = 256,
+                         num_beams: Optional[int] = None, translate=None):
+        """
+        Translate text while NLLB is still decoding.
+        Yields ('delta', text) events for new output, then ('result', TranslationResult).
+        
+        Only greedy decoding streams. Output that may be the start of an idiom
+        placeholder is held back until the placeholder is complete, so deltas
+        never show __IDIOM_ markers. The final result is authoritative (smart
+        injection can move idioms the deltas didn't contain).
+        
+        Args:
+            text: Text to translate
+            direction: 'en-si' or 'si-en'
+            max_length: Maximum output length in tokens
+            num_beams: Beam width for NLLB (None picks greedy or beam search per text)
+            translate: Callable(text, direction, num_beams) -> TranslationResult for
+                inputs that need beam search, e.g. a request batcher (default: translate)
+        """
+        exact_result, detected_idioms, modified_text, placeholder_map = self._prepare(text, direction)
+        if exact_result is not None:
+            yield 'result', exact_result
+            return
+        
+        if not self.is_loaded:
+            self.load_model()
+        if (num_beams or self._pick_num_beams(modified_text)) > 1:
+            # Beam search can't stream; send it through the batched path in one piece
+            result = (translate or self.translate)(text, direction, num_beams)
+            yield 'delta', result.translation
+            yield 'result', result
+            return
+        
+        pieces = []
+        buffer = ''
+        
+        for chunk in self._nllb_stream(modified_text, direction=direction, max_length=max_length):
+            pieces.append(chunk)
+            buffer += chunk
+            for placeholder, target_idiom in placeholder_map.items():
+                buffer = buffer.replace(placeholder, target_idiom)
+            ready, buffer = self._split_partial_placeholder(buffer, placeholder_map)
+            if ready:
+                yield 'delta', ready
+        
+        yield 'result', self._finish(text, direction, detected_idioms, placeholder_map, ''.join(pieces))
+    
+    @staticmethod
+    def _split_partial_placeholder(buffer: str, placeholders) -> Tuple[str, str]:
+        """Split buffer into (safe to emit, possible start of a placeholder)."""
+        if not placeholders:
+            return buffer, ''
+        
+        start = buffer.find('_')
+        while start != -1:
+            tail = buffer[start:]
+            if any(placeholder.startswith(tail) for placeholder in placeholders):
+                return buffer[:start], tail
+            start = buffer.find('_', start + 1)
+        
+        return buffer, ''
+    
+    def _prepare(self, text: str, direction: str):
+        """
+        Detect idioms and mask them for NLLB.
+        Returns (dataset result or None, detected idioms, masked text, placeholder map).
+        """
         if direction == 'en-si':
             # English to Sinhala
             detected_idioms = self.detector.detect(text)
@@ -260,7 +861,7 @@ class HybridTranslator:
             exact_translation = self._get_dataset_translation(text)
             
             if exact_translation:
-                return TranslationResult(
+                exact_result = TranslationResult(
                     source=text,
                     translation=exact_translation['sinhala'],
                     source_lang='en',
@@ -269,79 +870,40 @@ class HybridTranslator:
                     idiom_accuracy=1.0,
                     method="dataset_match"
                 )
-            
-            # Use NLLB + idiom injection
-            if detected_idioms:
-                modified_text = text
-                placeholder_map = {}
-                
-                for i, idiom in enumerate(detected_idioms):
-                    placeholder = f"__IDIOM_{i}__"
-                    pattern = re.compile(re.escape(idiom['english']), re.IGNORECASE)
-                    modified_text = pattern.sub(placeholder, modified_text, count=1)
-                    placeholder_map[placeholder] = idiom['sinhala']
-                
-                translation = self._nllb_translate(modified_text, direction=direction)
-                
-                for placeholder, target_idiom in placeholder_map.items():
-                    if placeholder in translation:
-                        translation = translation.replace(placeholder, target_idiom)
-                    else:
-                        translation = self._smart_inject(translation, target_idiom)
-                
-                method = "hybrid"
-            else:
-                translation = self._nllb_translate(text, direction=direction)
-                method = "nllb"
-                
-            # Calculate accuracy for English idioms
-            found = sum(1 for i in detected_idioms if i['sinhala'] in translation)
-            accuracy = found / len(detected_idioms) if detected_idioms else 1.0
-            
+                return exact_result, detected_idioms, None, None
         else:
             # Sinhala to English
             detected_idioms = self.detector.detect_sinhala(text)
-            
-            # Use NLLB + idiom injection
-            if detected_idioms:
-                modified_text = text
-                placeholder_map = {}
-                
-                for i, idiom in enumerate(detected_idioms):
-                    placeholder = f"__IDIOM_{i}__"
-                    # For Sinhala, do direct string replacement (no word boundaries)
-                    modified_text = modified_text.replace(idiom['sinhala'], placeholder, 1)
-                    placeholder_map[placeholder] = idiom['english']
-                
-                translation = self._nllb_translate(modified_text, direction=direction)
-                
-                for placeholder, target_idiom in placeholder_map.items():
-                    if placeholder in translation:
-                        translation = translation.replace(placeholder, target_idiom)
-                    else:
-                        # For English output, try to inject idiom naturally
-                        translation = self._smart_inject(translation, target_idiom)
-                
-                method = "hybrid"
+        
+        # Use NLLB + idiom injection
+        modified_text, placeholder_map = self._mask_idioms(text, detected_idioms, direction)
+        return None, detected_idioms, modified_text, placeholder_map
+    
+    def _finish(self, text: str, direction: str, detected_idioms: List[Dict],
+                placeholder_map: Dict[str, str], translation: str) -> TranslationResult:
+        """Put target idioms into the NLLB output and score idiom coverage."""
+        for placeholder, target_idiom in placeholder_map.items():
+            if placeholder in translation:
+                translation = translation.replace(placeholder, target_idiom)
             else:
-                translation = self._nllb_translate(text, direction=direction)
-                method = "nllb"
-            
+                translation = self._smart_inject(translation, target_idiom)
+        
+        if direction == 'en-si':
+            # Calculate accuracy for English idioms
+            found = sum(1 for i in detected_idioms if i['sinhala'] in translation)
+        else:
             # Calculate accuracy for Sinhala idioms
             found = sum(1 for i in detected_idioms if i['english'].lower() in translation.lower())
-            accuracy = found / len(detected_idioms) if detected_idioms else 1.0
-        
-        source_lang = 'en' if direction == 'en-si' else 'si'
-        target_lang = 'si' if direction == 'en-si' else 'en'
+        accuracy = found / len(detected_idioms) if detected_idioms else 1.0
         
         return TranslationResult(
             source=text,
             translation=translation,
-            source_lang=source_lang,
-            target_lang=target_lang,
+            source_lang='en' if direction == 'en-si' else 'si',
+            target_lang='si' if direction == 'en-si' else 'en',
             detected_idioms=detected_idioms,
             idiom_accuracy=accuracy,
-            method=method
+            method="hybrid" if detected_idioms else "nllb"
         )
 
 
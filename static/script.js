@@ -116,7 +116,7 @@ async function doTranslate() {
     btnLoader.classList.remove('hidden');
     
     try {
-        const response = await fetch(`${API_URL}/translate`, {
+        const response = await fetch(`${API_URL}/translate-stream`, {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json'
@@ -127,21 +127,27 @@ async function doTranslate() {
             })
         });
         
-        const data = await response.json();
-        
         if (!response.ok) {
             // Handle HTTP errors (400, 500, etc.)
+            const data = await response.json();
             const errorMsg = data.error || `Translation failed (${response.status})`;
             showToast(errorMsg, 5000);
             return;
         }
         
-        if (data.success) {
-            // Show translation
-            displayTranslation(data);
-        } else {
-            showToast(data.error || 'Translation failed', 5000);
-        }
+        // Show partial output as it is decoded, then the final result
+        const output = document.getElementById('translation-output');
+        output.textContent = '';
+        
+        await readEventStream(response, (event, data) => {
+            if (event === 'delta') {
+                output.textContent += data.text;
+            } else if (event === 'result') {
+                displayTranslation(data);
+            } else if (event === 'error') {
+                showToast(data.error || 'Translation failed', 5000);
+            }
+        });
     } catch (error) {
         console.error('Translation error:', error);
         showToast('Connection error. Make sure the server is running.', 5000);
@@ -153,6 +159,34 @@ async function doTranslate() {
     }
 }
 
+async function readEventStream(response, onEvent) {
+    // Parse a text/event-stream body into (event, JSON data) callbacks
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    
+    while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        
+        buffer += decoder.decode(value, { stream: true });
+        
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const message = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+            
+            let event = 'message';
+            let data = '';
+            for (const line of message.split('\n')) {
+                if (line.startsWith('event: ')) event = line.slice(7);
+                else if (line.startsWith('data: ')) data += line.slice(6);
+            }
+            if (data) onEvent(event, JSON.parse(data));
+        }
+    }
+}
+
 function displayTranslation(data) {
     // Show translation
     const output = document.getElementById('translation-output');
@@ -0,0 +1,17 @@
+"""
+WSGI Entry Point
+================
+Production entry for the Flask app. Loads the translator at boot so the
+first request doesn't pay the model load cost.
+
+    gunicorn -w 1 -k gthread --threads 16 --timeout 600 wsgi:app
+
+Use a single worker: it owns the model (and the GPU), while its threads
+feed concurrent /translate requests into the batch worker. Don't add
+--preload: the model would load in the master, and CUDA (and the torch
+thread pools) can't be used in a worker forked after that.
+"""
+
+from app import app, get_translator
+
+get_translator()